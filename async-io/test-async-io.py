@@ -10,7 +10,9 @@ async def count(i):
     return i
 
 async def main():
-    print(await asyncio.gather(count(3), count(2), count(1)))
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(count(i)) for i in (3, 2, 1)]
+    print([task.result() for task in tasks])
 
 if __name__ == "__main__":
     import time
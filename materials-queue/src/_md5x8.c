@@ -0,0 +1,238 @@
+// _md5x8.c
+//
+// 8-way MD5 for short messages, loaded by md5x8.py through ctypes.
+// md5_scan generates the candidates itself, so a whole Job is one call.
+//
+// Build it next to this file:
+//     cc -O3 -shared -fPIC -o _md5x8.so _md5x8.c
+//
+// Every message is padded into a single 64-byte block, which is
+// the case for any text of at most 55 bytes. The 8 blocks are transposed so
+// that each 32-bit lane of a __m256i holds the same word of a different block,
+// then the 64 MD5 steps run once for all 8 lanes. Without AVX2 the same blocks
+// are hashed one after another.
+
+#include <stdint.h>
+
+#if defined(__x86_64__) || defined(__i386__)
+#include <immintrin.h>
+#define HAVE_X86 1
+#endif
+
+#define LANES 8
+#define BLOCK_SIZE 64
+
+static const uint32_t K[64] = {
+    0xd76aa478, 0xe8c7b756, 0x242070db, 0xc1bdceee, 0xf57c0faf, 0x4787c62a,
+    0xa8304613, 0xfd469501, 0x698098d8, 0x8b44f7af, 0xffff5bb1, 0x895cd7be,
+    0x6b901122, 0xfd987193, 0xa679438e, 0x49b40821, 0xf61e2562, 0xc040b340,
+    0x265e5a51, 0xe9b6c7aa, 0xd62f105d, 0x02441453, 0xd8a1e681, 0xe7d3fbc8,
+    0x21e1cde6, 0xc33707d6, 0xf4d50d87, 0x455a14ed, 0xa9e3e905, 0xfcefa3f8,
+    0x676f02d9, 0x8d2a4c8a, 0xfffa3942, 0x8771f681, 0x6d9d6122, 0xfde5380c,
+    0xa4beea44, 0x4bdecfa9, 0xf6bb4b60, 0xbebfbc70, 0x289b7ec6, 0xeaa127fa,
+    0xd4ef3085, 0x04881d05, 0xd9d4d039, 0xe6db99e5, 0x1fa27cf8, 0xc4ac5665,
+    0xf4292244, 0x432aff97, 0xab9423a7, 0xfc93a039, 0x655b59c3, 0x8f0ccc92,
+    0xffeff47d, 0x85845dd1, 0x6fa87e4f, 0xfe2ce6e0, 0xa3014314, 0x4e0811a1,
+    0xf7537e82, 0xbd3af235, 0x2ad7d2bb, 0xeb86d391,
+};
+
+static const int S[64] = {
+    7, 12, 17, 22, 7, 12, 17, 22, 7, 12, 17, 22, 7, 12, 17, 22,
+    5, 9,  14, 20, 5, 9,  14, 20, 5, 9,  14, 20, 5, 9,  14, 20,
+    4, 11, 16, 23, 4, 11, 16, 23, 4, 11, 16, 23, 4, 11, 16, 23,
+    6, 10, 15, 21, 6, 10, 15, 21, 6, 10, 15, 21, 6, 10, 15, 21,
+};
+
+static const uint32_t INIT[4] = {0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476};
+
+static int message_index(int i) {
+    switch (i / 16) {
+    case 0: return i;
+    case 1: return (5 * i + 1) % 16;
+    case 2: return (3 * i + 5) % 16;
+    default: return (7 * i) % 16;
+    }
+}
+
+static uint32_t load_le32(const unsigned char *p) {
+    return (uint32_t)p[0] | (uint32_t)p[1] << 8 | (uint32_t)p[2] << 16 |
+           (uint32_t)p[3] << 24;
+}
+
+static uint32_t rotl32(uint32_t x, int s) { return (x << s) | (x >> (32 - s)); }
+
+static void md5_block(const unsigned char *block, uint32_t out[4]) {
+    uint32_t m[16];
+    for (int w = 0; w < 16; w++) {
+        m[w] = load_le32(block + 4 * w);
+    }
+    uint32_t a = INIT[0], b = INIT[1], c = INIT[2], d = INIT[3];
+    for (int i = 0; i < 64; i++) {
+        uint32_t f;
+        switch (i / 16) {
+        case 0: f = (b & c) | (~b & d); break;
+        case 1: f = (d & b) | (~d & c); break;
+        case 2: f = b ^ c ^ d; break;
+        default: f = c ^ (b | ~d); break;
+        }
+        f += a + K[i] + m[message_index(i)];
+        a = d;
+        d = c;
+        c = b;
+        b += rotl32(f, S[i]);
+    }
+    out[0] = a + INIT[0];
+    out[1] = b + INIT[1];
+    out[2] = c + INIT[2];
+    out[3] = d + INIT[3];
+}
+
+static int md5x8_scalar(const unsigned char *blocks, const uint32_t target[4]) {
+    for (int lane = 0; lane < LANES; lane++) {
+        uint32_t digest[4];
+        md5_block(blocks + lane * BLOCK_SIZE, digest);
+        if (digest[0] == target[0] && digest[1] == target[1] &&
+            digest[2] == target[2] && digest[3] == target[3]) {
+            return lane;
+        }
+    }
+    return -1;
+}
+
+#ifdef HAVE_X86
+__attribute__((target("avx2")))
+static __m256i rotl256(__m256i x, int s) {
+    return _mm256_or_si256(_mm256_sll_epi32(x, _mm_cvtsi32_si128(s)),
+                           _mm256_srl_epi32(x, _mm_cvtsi32_si128(32 - s)));
+}
+
+__attribute__((target("avx2")))
+static int md5x8_avx2(const unsigned char *blocks, const uint32_t target[4]) {
+    __m256i m[16];
+    for (int w = 0; w < 16; w++) {
+        uint32_t words[LANES];
+        for (int lane = 0; lane < LANES; lane++) {
+            words[lane] = load_le32(blocks + lane * BLOCK_SIZE + 4 * w);
+        }
+        m[w] = _mm256_loadu_si256((const __m256i *)words);
+    }
+    const __m256i ones = _mm256_set1_epi32(-1);
+    __m256i a = _mm256_set1_epi32((int)INIT[0]);
+    __m256i b = _mm256_set1_epi32((int)INIT[1]);
+    __m256i c = _mm256_set1_epi32((int)INIT[2]);
+    __m256i d = _mm256_set1_epi32((int)INIT[3]);
+    for (int i = 0; i < 64; i++) {
+        __m256i f;
+        switch (i / 16) {
+        case 0:
+            f = _mm256_or_si256(_mm256_and_si256(b, c), _mm256_andnot_si256(b, d));
+            break;
+        case 1:
+            f = _mm256_or_si256(_mm256_and_si256(d, b), _mm256_andnot_si256(d, c));
+            break;
+        case 2:
+            f = _mm256_xor_si256(_mm256_xor_si256(b, c), d);
+            break;
+        default:
+            f = _mm256_xor_si256(c, _mm256_or_si256(b, _mm256_xor_si256(d, ones)));
+            break;
+        }
+        f = _mm256_add_epi32(f, a);
+        f = _mm256_add_epi32(f, _mm256_set1_epi32((int)K[i]));
+        f = _mm256_add_epi32(f, m[message_index(i)]);
+        a = d;
+        d = c;
+        c = b;
+        b = _mm256_add_epi32(b, rotl256(f, S[i]));
+    }
+    a = _mm256_add_epi32(a, _mm256_set1_epi32((int)INIT[0]));
+    b = _mm256_add_epi32(b, _mm256_set1_epi32((int)INIT[1]));
+    c = _mm256_add_epi32(c, _mm256_set1_epi32((int)INIT[2]));
+    d = _mm256_add_epi32(d, _mm256_set1_epi32((int)INIT[3]));
+
+    __m256i hit = _mm256_cmpeq_epi32(a, _mm256_set1_epi32((int)target[0]));
+    hit = _mm256_and_si256(hit, _mm256_cmpeq_epi32(b, _mm256_set1_epi32((int)target[1])));
+    hit = _mm256_and_si256(hit, _mm256_cmpeq_epi32(c, _mm256_set1_epi32((int)target[2])));
+    hit = _mm256_and_si256(hit, _mm256_cmpeq_epi32(d, _mm256_set1_epi32((int)target[3])));
+    int mask = _mm256_movemask_ps(_mm256_castsi256_ps(hit));
+    return mask ? __builtin_ctz(mask) : -1;
+}
+#endif
+
+static int md5x8_dispatch(const unsigned char *blocks, const uint32_t target[4]) {
+#ifdef HAVE_X86
+    if (__builtin_cpu_supports("avx2")) {
+        return md5x8_avx2(blocks, target);
+    }
+#endif
+    return md5x8_scalar(blocks, target);
+}
+
+static void load_target(const unsigned char *target_digest, uint32_t target[4]) {
+    for (int w = 0; w < 4; w++) {
+        target[w] = load_le32(target_digest + 4 * w);
+    }
+}
+
+// Hash the combinations [start, stop) of `length` letters taken from
+// `alphabet`, in the same order as Combinations.iter_range in
+// multiprocess_queue.py. The letters are kept as digits of an odometer and
+// written straight into 8 padded blocks at a time.
+// Returns the index of the combination whose digest is target_digest and
+// copies its letters into out, or returns -1 when none of them match.
+long long md5_scan(const unsigned char *alphabet, int base, int length,
+                   unsigned long long start, unsigned long long stop,
+                   const unsigned char *target_digest, unsigned char *out) {
+    if (length < 0 || length > BLOCK_SIZE - 9 || start >= stop) {
+        return -1;
+    }
+    uint32_t target[4];
+    load_target(target_digest, target);
+
+    int digits[BLOCK_SIZE];
+    unsigned long long rest = start;
+    for (int i = length - 1; i >= 0; i--) {
+        digits[i] = (int)(rest % (unsigned long long)base);
+        rest /= (unsigned long long)base;
+    }
+
+    unsigned char blocks[LANES * BLOCK_SIZE] = {0};
+    for (int lane = 0; lane < LANES; lane++) {
+        unsigned char *block = blocks + lane * BLOCK_SIZE;
+        uint64_t bits = (uint64_t)length * 8;
+        block[length] = 0x80;
+        for (int b = 0; b < 8; b++) {
+            block[BLOCK_SIZE - 8 + b] = (unsigned char)(bits >> (8 * b));
+        }
+    }
+
+    for (unsigned long long first = start; first < stop; first += LANES) {
+        int count = stop - first < LANES ? (int)(stop - first) : LANES;
+        for (int lane = 0; lane < LANES; lane++) {
+            unsigned char *block = blocks + lane * BLOCK_SIZE;
+            if (lane >= count) {
+                // pad the last batch with its first candidate, which is
+                // always reported first by md5x8_dispatch
+                for (int i = 0; i < length; i++) {
+                    block[i] = blocks[i];
+                }
+                continue;
+            }
+            for (int i = 0; i < length; i++) {
+                block[i] = alphabet[digits[i]];
+            }
+            int i = length - 1;
+            while (i >= 0 && ++digits[i] == base) {
+                digits[i--] = 0;  // carry to the left
+            }
+        }
+        int lane = md5x8_dispatch(blocks, target);
+        if (lane >= 0) {
+            for (int i = 0; i < length; i++) {
+                out[i] = blocks[lane * BLOCK_SIZE + i];
+            }
+            return (long long)(first + (unsigned long long)lane);
+        }
+    }
+    return -1;
+}
@@ -3,97 +3,104 @@
 import argparse
 import asyncio
 import sys
-from collections import Counter
-from typing import NamedTuple
 from urllib.parse import urljoin
 
 import aiohttp
-from bs4 import BeautifulSoup
-
-
-class Job(NamedTuple):
-    url: str
-    depth: int = 1
-
-    def __lt__(self, other):
-        if isinstance(other, Job):
-            return len(self.url) < len(other.url) # 优先级：url长度
+from selectolax.parser import HTMLParser
 
 
 async def main(args):
-    session = aiohttp.ClientSession()
+    # AsyncResolver基于aiodns，DNS查询不再占用默认线程池；并缓存DNS结果，复用连接
+    connector = aiohttp.TCPConnector(
+        resolver=aiohttp.AsyncResolver(),
+        use_dns_cache=True,
+        ttl_dns_cache=300,
+        limit=args.num_workers * 4,
+        limit_per_host=4,
+    )
+    session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=10),
+    )
     try:
-        links = Counter()
-        # uncomment one of the following lines to use a different queue
-        # queue = asyncio.Queue()
-        # queue = asyncio.LifoQueue()
-        queue = asyncio.PriorityQueue()
-        tasks = [
-            asyncio.create_task(
-                worker(
-                    f"Worker-{i + 1}",
+        # visited用于在创建task之前去重，links记录每个url被发现时的depth
+        visited = {args.url}
+        links = {args.url: 1}
+        # semaphore限制同时进行的请求数，而不是固定数量的worker task
+        semaphore = asyncio.Semaphore(args.num_workers)
+
+        # 每个url的task直接为新发现的链接创建task，不再经过queue的put/get
+        # TaskGroup退出时，所有（包括后来创建的）task都已完成
+        async with asyncio.TaskGroup() as task_group:
+            task_group.create_task(
+                crawl(
                     session,
-                    queue,
+                    args.url,
+                    1,
+                    visited,
+                    semaphore,
                     links,
                     args.max_depth,
+                    task_group,
                 )
             )
-            for i in range(args.num_workers)
-        ]
-
-        await queue.put(Job(args.url))
-        await queue.join()
-
-        for task in tasks:
-            task.cancel()
-
-        await asyncio.gather(*tasks, return_exceptions=True)
 
         display(links)
     finally:
         await session.close()
 
 
-async def worker(worker_id, session, queue, links, max_depth):
-    print(f"[{worker_id} starting]", file=sys.stderr)
-    while True:
-        # 获取到一个url，计数+1
-        # 使用fetch_html以及parse_links获取到该url下的所有链接
-        # 并将这些链接放入queue中，depth+1
-        url, depth = await queue.get()
-        links[url] += 1
-        print(f"[{worker_id} {depth=} {url=} {links[url]}]")
-        try:
-            # 以下实现方式会将depth大于max_depth的url也放入queue中，增加无谓的put & get操作，也会导致links[url]的计数不准确
-            # if depth <= max_depth:
-            #     print(f"[{worker_id} {depth=} {url=}]", file=sys.stderr)
-            #     if html := await fetch_html(session, url):
-            #         for link_url in parse_links(url, html):
-            #             await queue.put(Job(link_url, depth + 1))
-            
-            if depth < max_depth: # depth + 1 <= max_depth
-                if html := await fetch_html(session, url): # fetch html from url, within session
-                    for link_url in parse_links(url, html): # parse links from html, 组合拳
-                        # print(f'{url} -> {link_url}')
-                        await queue.put(Job(link_url, depth + 1))
-        except aiohttp.ClientError:
-            print(f"[{worker_id} failed at {url=}]", file=sys.stderr)
-        finally:
-            queue.task_done()
+async def crawl(session, url, depth, visited, semaphore, links, max_depth, task_group):
+    # 使用fetch_html以及parse_links获取到该url下的所有链接
+    # 并为未访问过的链接创建新的task，depth+1
+    print(f"[{depth=} {url=}]")
+    try:
+        if depth < max_depth: # depth + 1 <= max_depth
+            async with semaphore:
+                html = await fetch_html(session, url) # fetch html from url, within session
+            if html:
+                # 解析html是同步的CPU操作，放到线程池中执行，避免阻塞event loop
+                link_urls = await asyncio.get_running_loop().run_in_executor(
+                    None, parse_links, url, html
+                )
+                for link_url in link_urls: # parse links from html, 组合拳
+                    # 在创建task之前去重，同一个url只会被fetch一次
+                    if link_url not in visited:
+                        visited.add(link_url)
+                        links[link_url] = depth + 1
+                        task_group.create_task(
+                            crawl(
+                                session,
+                                link_url,
+                                depth + 1,
+                                visited,
+                                semaphore,
+                                links,
+                                max_depth,
+                                task_group,
+                            )
+                        )
+    except Exception as error:
+        # 任何异常都只结束这一个url（例如解码失败、非法链接），不应该取消TaskGroup中的其他task
+        print(f"[failed at {url=}: {error!r}]", file=sys.stderr)
 
 
 async def fetch_html(session, url):
-    async with session.get(url) as response:
-        if response.ok and response.content_type == "text/html":
-            return await response.text()
+    # 进入async with时只读取了响应头，content_type不是text/html时直接返回，不下载响应体
+    async with session.get(url, headers={"Accept": "text/html"}) as response:
+        if not response.ok or response.content_type != "text/html":
+            return None
+        return await response.text()
 
 
 def parse_links(url, html):
-    soup = BeautifulSoup(html, features="html.parser")
-    for anchor in soup.select("a[href]"):
-        href = anchor.get("href").lower()
+    # 返回list而不是generator，保证解析在executor中完成，而不是在event loop中迭代时才进行
+    links = []
+    for anchor in HTMLParser(html).css("a[href]"):
+        href = (anchor.attributes["href"] or "").lower()
         if not href.startswith("javascript:"):
-            yield urljoin(url, href)
+            links.append(urljoin(url, href))
+    return links
 
 # an elegent way to parse command line arguments
 def parse_args():
@@ -105,9 +112,9 @@ def parse_args():
 
 
 def display(links):
-    # Counter.most_common() returns n most common elements in the counter, if None, return all elements
-    for url, count in links.most_common():
-        print(f"{count:>3} {url}")
+    # 按照被发现时的depth排序输出
+    for url, depth in sorted(links.items(), key=lambda item: item[1]):
+        print(f"{depth:>3} {url}")
 
 # TEST
 async def test():
@@ -0,0 +1,141 @@
+# cuda_worker.py
+
+import math
+from string import ascii_lowercase
+
+import numpy as np
+from numba import cuda, int64
+
+from multiprocess_queue import chunk_indices
+
+THREADS_PER_BLOCK = 256
+# 每次kernel launch最多处理的组合数量，避免单次launch运行时间过长
+CHUNK_SIZE = 1 << 26
+NOT_FOUND = np.iinfo(np.int64).max
+# 所有32位运算都使用int64并与MASK取与，避免numba将uint64与int64混合运算提升为float
+MASK = 0xFFFFFFFF
+
+K = np.array(
+    [int(abs(math.sin(i + 1)) * 2**32) & MASK for i in range(64)],
+    dtype=np.int64,
+)
+S = np.array(
+    [7, 12, 17, 22] * 4 + [5, 9, 14, 20] * 4 + [4, 11, 16, 23] * 4 + [6, 10, 15, 21] * 4,
+    dtype=np.int64,
+)
+INIT = np.array([0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476], dtype=np.int64)
+
+
+@cuda.jit
+def md5_kernel(start_index, count, length, alphabet, target, out):
+    """each thread decodes one index into a candidate, hashes it and compares
+
+    Args:
+        start_index (int): index of the first combination of this launch
+        count (int): number of combinations of this launch
+        length (int): number of letters per combination, the indices must fit
+            in an int64, e.g. at most 13 lowercase letters
+        alphabet (device array of uint8): the letters
+        target (device array of int64): the digest as 4 little-endian words
+        out (device array of int64): out[0] receives the smallest matching index
+    """
+    offset = cuda.grid(1)
+    if offset >= count:
+        return
+    index = start_index + offset
+
+    k = cuda.const.array_like(K)
+    s = cuda.const.array_like(S)
+    init = cuda.const.array_like(INIT)
+
+    # 按照base-len(alphabet)解码index，直接写入md5的16个message word
+    m = cuda.local.array(16, int64)
+    for w in range(16):
+        m[w] = 0
+    base = alphabet.shape[0]
+    rest = index
+    for position in range(length - 1, -1, -1):
+        letter = alphabet[rest % base]
+        rest //= base
+        m[position // 4] |= int64(letter) << (8 * (position % 4))
+    m[length // 4] |= 0x80 << (8 * (length % 4))
+    m[14] = length * 8
+
+    a = init[0]
+    b = init[1]
+    c = init[2]
+    d = init[3]
+    for i in range(64):
+        if i < 16:
+            f = (b & c) | ((b ^ MASK) & d)
+            g = i
+        elif i < 32:
+            f = (d & b) | ((d ^ MASK) & c)
+            g = (5 * i + 1) % 16
+        elif i < 48:
+            f = b ^ c ^ d
+            g = (3 * i + 5) % 16
+        else:
+            f = c ^ (b | (d ^ MASK))
+            g = (7 * i) % 16
+        f = (f + a + k[i] + m[g]) & MASK
+        a = d
+        d = c
+        c = b
+        b = (b + ((f << s[i]) | (f >> (32 - s[i])))) & MASK
+
+    a = (a + init[0]) & MASK
+    b = (b + init[1]) & MASK
+    c = (c + init[2]) & MASK
+    d = (d + init[3]) & MASK
+    if a == target[0] and b == target[1] and c == target[2] and d == target[3]:
+        cuda.atomic.min(out, 0, index)
+
+
+def cuda_reverse_md5(hash_value, length, alphabet=ascii_lowercase):
+    """search all combinations of the given length on every available GPU
+
+    The index space is split between the GPUs with chunk_indices, and every GPU
+    covers its span with launches of at most CHUNK_SIZE threads.
+
+    Args:
+        hash_value (str): md5 hexdigest to reverse
+        length (int): number of letters to try
+        alphabet (str, optional): Defaults to ascii_lowercase.
+
+    Returns:
+        str | None: the matching text, or None
+    """
+    target = np.frombuffer(bytes.fromhex(hash_value), dtype="<u4").astype(np.int64)
+    letters = np.frombuffer(alphabet.encode("utf-8"), dtype=np.uint8)
+    total = len(alphabet) ** length
+
+    # 每个GPU上的kernel launch是异步的，先全部launch，再统一同步读取结果
+    launched = []
+    for gpu, (start, stop) in zip(cuda.gpus, chunk_indices(total, len(cuda.gpus))):
+        with gpu:
+            stream = cuda.stream()
+            d_alphabet = cuda.to_device(letters, stream=stream)
+            d_target = cuda.to_device(target, stream=stream)
+            d_out = cuda.to_device(np.array([NOT_FOUND], dtype=np.int64), stream=stream)
+            for chunk_start in range(start, stop, CHUNK_SIZE):
+                count = min(CHUNK_SIZE, stop - chunk_start)
+                blocks = (count + THREADS_PER_BLOCK - 1) // THREADS_PER_BLOCK
+                md5_kernel[blocks, THREADS_PER_BLOCK, stream](
+                    chunk_start, count, length, d_alphabet, d_target, d_out
+                )
+            launched.append((gpu, stream, d_out))
+
+    found = NOT_FOUND
+    for gpu, stream, d_out in launched:
+        with gpu:
+            stream.synchronize()
+            found = min(found, int(d_out.copy_to_host()[0]))
+
+    if found == NOT_FOUND:
+        return None
+    letters_found = []
+    for _ in range(length):
+        found, digit = divmod(found, len(alphabet))
+        letters_found.append(alphabet[digit])
+    return "".join(reversed(letters_found))
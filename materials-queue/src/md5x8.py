@@ -0,0 +1,58 @@
+# md5x8.py
+
+import ctypes
+from pathlib import Path
+
+BLOCK_SIZE = 64
+# 一个64字节的block最多可以容纳55字节的文本，剩余的字节用于0x80和长度
+MAX_TEXT_LENGTH = BLOCK_SIZE - 9
+# md5_scan的start和stop是uint64，返回的index是long long，更大的index会被截断
+MAX_INDEX = 2**63
+
+try:
+    _library = ctypes.CDLL(str(Path(__file__).with_name("_md5x8.so")))
+except OSError:
+    # 没有编译_md5x8.c时，调用方应退回到hashlib
+    _library = None
+else:
+    _library.md5_scan.argtypes = (
+        ctypes.c_char_p,
+        ctypes.c_int,
+        ctypes.c_int,
+        ctypes.c_uint64,
+        ctypes.c_uint64,
+        ctypes.c_char_p,
+        ctypes.c_char_p,
+    )
+    _library.md5_scan.restype = ctypes.c_longlong
+
+
+def available():
+    return _library is not None
+
+
+def scan(alphabet, length, start, stop, target_digest):
+    """hash the combinations [start, stop) in C and look for target_digest
+
+    The combinations are generated inside the C extension in the same order as
+    Combinations.iter_range, so the whole range is a single call.
+
+    Args:
+        alphabet (bytes): the letters, one byte each
+        length (int): number of letters per combination, at most 55
+        start (int): index of the first combination
+        stop (int): index after the last combination
+        target_digest (bytes): the 16-byte digest to look for
+
+    Raises:
+        OverflowError: if stop is larger than MAX_INDEX
+
+    Returns:
+        bytes | None: the matching combination, or None
+    """
+    if stop > MAX_INDEX:
+        raise OverflowError(f"index {stop} does not fit in the C extension")
+    out = ctypes.create_string_buffer(length)
+    if _library.md5_scan(alphabet, len(alphabet), length, start, stop, target_digest, out) < 0:
+        return None
+    return out.raw
@@ -0,0 +1,39 @@
+from hashlib import md5
+from string import ascii_lowercase
+
+import md5x8
+from multiprocess_queue import Combinations, Job
+
+assert md5x8.available(), "Build _md5x8.so first: cc -O3 -shared -fPIC -o _md5x8.so _md5x8.c"
+
+# 检验C扩展的md5_scan是否正确，与hashlib逐个计算的结果进行比较
+alphabet = Combinations(ascii_lowercase, 1).alphabet_bytes
+for length in range(1, 5):
+    combinations = Combinations(ascii_lowercase, length)
+    # 覆盖range的起点、终点，以及不足8个候选的最后一批
+    for index in {0, 1, 7, 8, 9, len(combinations) // 2, len(combinations) - 1}:
+        text = combinations[index].encode("utf-8")
+        target = md5(text).digest()
+        for start, stop in [(0, len(combinations)), (index, index + 1), (index, index + 3)]:
+            stop = min(stop, len(combinations))
+            assert md5x8.scan(alphabet, length, start, stop, target) == text, "The implementation is wrong"
+        assert md5x8.scan(alphabet, length, index + 1, len(combinations), target) is None, "The implementation is wrong"
+print("🎉🎉🎉🎉🎉🎉🎉🎉🎉 md5_scan")
+
+# 13个字母的index仍然在MAX_INDEX之内，14个字母的index超出了MAX_INDEX
+stop = len(ascii_lowercase) ** 13
+text = ("z" * 13).encode("utf-8")
+assert md5x8.scan(alphabet, 13, stop - 5, stop, md5(text).digest()) == text, "The implementation is wrong"
+stop = len(ascii_lowercase) ** 14
+try:
+    md5x8.scan(alphabet, 14, stop - 5, stop, md5(b"z" * 14).digest())
+except OverflowError:
+    pass
+else:
+    raise AssertionError("The implementation is wrong")
+print("🎉🎉🎉🎉🎉🎉🎉🎉🎉 md5_scan overflow")
+
+# 超出C扩展范围的Job应退回到hashlib，而不是检查错误的组合
+job = Job(Combinations(ascii_lowercase, 14), stop - 5, stop)
+assert job(md5(b"z" * 14).hexdigest()) == "z" * 14, "The implementation is wrong"
+print("🎉🎉🎉🎉🎉🎉🎉🎉🎉 large indices")
@@ -5,20 +5,39 @@ import multiprocessing
 import queue
 import time
 from dataclasses import dataclass
+from fractions import Fraction
 from hashlib import md5
 from string import ascii_lowercase
 
 from itertools import product
 
+import md5x8
+
 # Choosing the value for a sentinel can be tricky, especially with the multiprocessing module because of how it handles the global namespace.
 # It’s probably safest to stick to a predefined value such as None, which has a known identity everywhere
 POISON_PILL = None
 
+# 启动时每个Worker分批计算md5，至少持续BENCHMARK_SECONDS，用于估计其速度
+# 只计时一小批的话，C扩展几毫秒就能完成，结果主要是调度噪声
+BENCHMARK_LENGTH = 5
+BENCHMARK_SIZE = 20_000
+BENCHMARK_SECONDS = 0.05
+
+# CUDA kernel中的index是int64，26**13 < 2**63 <= 26**14，所以GPU最多只能尝试13个字母
+MAX_GPU_LENGTH = 13
+
 
 class Combinations:
     def __init__(self, alphabet, length):
         self.alphabet = alphabet
         self.length = length
+        # 字母表中的每个字母都是单字节的，odometer直接在bytes上进位
+        self.alphabet_bytes = alphabet.encode("utf-8")
+        # _successor[letter]是字母表中letter的下一个字母，进位时查表，无需计算位置
+        successor = bytearray(256)
+        for letter, following in zip(self.alphabet_bytes, self.alphabet_bytes[1:]):
+            successor[letter] = following
+        self._successor = bytes(successor)
 
     def __len__(self):
         return len(self.alphabet) ** self.length
@@ -26,12 +45,46 @@ class Combinations:
     def __getitem__(self, index):
         if index >= len(self):
             raise IndexError
-        return "".join(
-            self.alphabet[
-                (index // len(self.alphabet) ** i) % len(self.alphabet)
-            ]
-            for i in reversed(range(self.length))
-        )
+        return self._decode(index).decode("utf-8")
+
+    def _decode(self, index):
+        # 将index按照base-len(alphabet)解码，只在每个range的起点调用一次
+        base = len(self.alphabet_bytes)
+        buffer = bytearray(self.length)
+        for i in reversed(range(self.length)):
+            index, digit = divmod(index, base)
+            buffer[i] = self.alphabet_bytes[digit]
+        return buffer
+
+    def iter_range(self, start, stop):
+        """yield the combinations in [start, stop) as bytes, like an odometer
+
+        Only the first combination is decoded from its index, every following one
+        is obtained by incrementing the last letter and carrying to the left,
+        so there is no division or string building per candidate.
+
+        Args:
+            start (int): index of the first combination
+            stop (int): index after the last combination
+
+        Yields:
+            bytes: the encoded combination
+        """
+        if start >= stop:
+            return
+        successor = self._successor
+        first, last = self.alphabet_bytes[0], self.alphabet_bytes[-1]
+        buffer = self._decode(start)
+        current = start
+        while current < stop:
+            yield bytes(buffer)
+            current += 1
+            i = self.length - 1
+            while i >= 0 and buffer[i] == last:
+                buffer[i] = first  # carry to the left
+                i -= 1
+            if i >= 0:
+                buffer[i] = successor[buffer[i]]
 
 
 @dataclass(frozen=True)
@@ -41,15 +94,75 @@ class Job:
     stop_index: int
 
     def __call__(self, hash_value):
-        for index in range(self.start_index, self.stop_index):
-            text_bytes = self.combinations[index].encode("utf-8")
-            hashed = md5(text_bytes).hexdigest()
+        # 比较16字节的digest，而不是32个字符的hexdigest
+        target = bytes.fromhex(hash_value)
+        if (
+            md5x8.available()
+            and self.combinations.length <= md5x8.MAX_TEXT_LENGTH
+            and self.stop_index <= md5x8.MAX_INDEX
+        ):
+            # 生成组合与计算md5都在C扩展中完成，整个Job只需一次调用
+            if text_bytes := md5x8.scan(
+                self.combinations.alphabet_bytes,
+                self.combinations.length,
+                self.start_index,
+                self.stop_index,
+                target,
+            ):
+                return text_bytes.decode("utf-8")
+            return None
+        for text_bytes in self.combinations.iter_range(
+            self.start_index, self.stop_index
+        ):
             # 如果我们找到了一个匹配的散列值，我们将其返回
             # 否则，我们将返回None
-            if hashed == hash_value:
+            if md5(text_bytes).digest() == target:
                 return text_bytes.decode("utf-8")
 
 
+class JobRing:
+    """a single-producer, single-consumer ring of jobs in shared memory
+
+    A job is fully described by (start_index, stop_index, length) over the
+    lowercase alphabet, so only three integers are copied into the shared array
+    instead of pickling a Job and sending it through a pipe. A length of 0
+    marks the POISON_PILL.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self._slots = multiprocessing.RawArray("Q", capacity * 3)
+        self._head = multiprocessing.RawValue("Q", 0)  # 下一个读取的位置
+        self._tail = multiprocessing.RawValue("Q", 0)  # 下一个写入的位置
+        # 只在ring为空（读）或已满（写）时才需要等待
+        self._changed = multiprocessing.Condition()
+
+    def put(self, job):
+        if job is POISON_PILL:
+            triplet = (0, 0, 0)
+        else:
+            triplet = (job.start_index, job.stop_index, job.combinations.length)
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._tail.value - self._head.value < self.capacity
+            )
+            slot = self._tail.value % self.capacity * 3
+            self._slots[slot : slot + 3] = triplet
+            self._tail.value += 1
+            self._changed.notify()
+
+    def get(self):
+        with self._changed:
+            self._changed.wait_for(lambda: self._head.value < self._tail.value)
+            slot = self._head.value % self.capacity * 3
+            start_index, stop_index, length = self._slots[slot : slot + 3]
+            self._head.value += 1
+            self._changed.notify()
+        if length == 0:
+            return POISON_PILL
+        return Job(Combinations(ascii_lowercase, length), start_index, stop_index)
+
+
 class Worker(multiprocessing.Process):
     def __init__(self, queue_in, queue_out, hash_value):
         super().__init__(daemon=True)
@@ -58,39 +171,74 @@ class Worker(multiprocessing.Process):
         self.hash_value = hash_value
 
     def run(self):
+        self.queue_out.put((self.name, self.benchmark()))
         while True:
             job = self.queue_in.get()
             if job is POISON_PILL:
-                # 如果我们收到毒丸，我们将其放回队列并退出, 以便其他Worker也可以退出
-                self.queue_in.put(POISON_PILL)
+                # 每个Worker有自己的ring，收到毒丸直接退出即可
                 break
             if plaintext := job(self.hash_value):
                 # 如果job返回值不是None，则表示我们找到了一个匹配的反编码组合，我们将其放入输出队列
                 self.queue_out.put(plaintext)
                 break
 
+    def benchmark(self):
+        # 返回每秒可以检查的组合数量；全0的散列值不会匹配任何组合
+        combinations = Combinations(ascii_lowercase, BENCHMARK_LENGTH)
+        checked = 0
+        t1 = time.perf_counter()
+        while (elapsed := time.perf_counter() - t1) < BENCHMARK_SECONDS:
+            start = checked % (len(combinations) - BENCHMARK_SIZE)
+            Job(combinations, start, start + BENCHMARK_SIZE)("0" * 32)
+            checked += BENCHMARK_SIZE
+        return checked / elapsed
+
 
 def main(args):
     t1 = time.perf_counter()
 
-    queue_in = multiprocessing.Queue()
+    # 每个Worker有自己的输入ring，这样才能按照各自的速度分配不同大小的chunk
+    queues_in = [JobRing() for _ in range(args.num_workers)]
     queue_out = multiprocessing.Queue()
 
     workers = [
         Worker(queue_in, queue_out, args.hash_value)
-        for _ in range(args.num_workers)
+        for queue_in in queues_in
     ]
 
     for worker in workers:
         worker.start()
 
+    # 收集每个Worker的benchmark结果作为权重
+    # 与下面等待结果的循环一样使用timeout，Worker在汇报之前退出时不会一直阻塞
+    speeds = {}
+    while len(speeds) < len(workers):
+        try:
+            name, speed = queue_out.get(timeout=0.1)
+            speeds[name] = speed
+        except queue.Empty:
+            if not any(
+                worker.is_alive() for worker in workers if worker.name not in speeds
+            ):
+                break
+
+    # 只给汇报了benchmark的Worker分配任务
+    workers = [worker for worker in workers if worker.name in speeds]
+    if not workers:
+        print("Unable to find a solution")
+        return
+    weights = [speeds[worker.name] for worker in workers]
+
     for text_length in range(1, args.max_length + 1):
         combinations = Combinations(ascii_lowercase, text_length)
-        for indices in chunk_indices(len(combinations), len(workers)):
-            queue_in.put(Job(combinations, *indices))
+        for worker, indices in zip(
+            workers, chunk_indices_weighted(len(combinations), weights)
+        ):
+            worker.queue_in.put(Job(combinations, *indices))
 
     # use POISON_PILL to signal the end of the queue
-    queue_in.put(POISON_PILL)
+    for worker in workers:
+        worker.queue_in.put(POISON_PILL)
 
     while any(worker.is_alive() for worker in workers):
         try:
@@ -105,6 +253,20 @@ def main(args):
         print("Unable to find a solution")
 
 
+def main_cuda(args):
+    # 只有在使用GPU时才导入numba
+    from cuda_worker import cuda_reverse_md5
+
+    t1 = time.perf_counter()
+    for text_length in range(1, args.max_length + 1):
+        if solution := cuda_reverse_md5(args.hash_value, text_length):
+            t2 = time.perf_counter()
+            print(f"{solution} (found in {t2 - t1:.1f}s)")
+            break
+    else:
+        print("Unable to find a solution")
+
+
 def main_single(args):
     # single thread
     t1 = time.perf_counter()
@@ -123,7 +285,11 @@ def parse_args():
         default=multiprocessing.cpu_count(),
     )
     # default workers will be set to the number of cores on the machine
-    return parser.parse_args()
+    parser.add_argument("-g", "--gpu", action="store_true")
+    args = parser.parse_args()
+    if args.gpu and args.max_length > MAX_GPU_LENGTH:
+        parser.error(f"--gpu supports a --max-length of at most {MAX_GPU_LENGTH}")
+    return args
 
 
 def chunk_indices(length, num_chunks):
@@ -145,6 +311,29 @@ def chunk_indices(length, num_chunks):
         num_chunks -= 1
 
 
+def chunk_indices_weighted(length, weights):
+    """split length into len(weights) chunks, proportional to weights
+
+    The weights are converted to Fractions, so the chunks are cut at the exact
+    cumulative boundaries length * cumulative_weight // total, even when length
+    is much larger than a float can represent. Every weight gets a chunk,
+    possibly an empty one, so the chunks can be zipped with the weights.
+
+    Args:
+        length (int): number of items to be split
+        weights (list of float): relative speed of each worker
+
+    Yields:
+        start, end pairs (int, int): start and stop indices of each chunk
+    """
+    weights = [Fraction(weight) for weight in weights]
+    total = sum(weights)
+    start, cumulative = 0, Fraction(0)
+    for weight in weights:
+        cumulative += weight
+        yield start, (start := length * cumulative // total)
+
+
 def reverse_md5(hash_value, alphabet=ascii_lowercase, max_length=6):
     for length in range(1, max_length + 1):
         for combination in product(alphabet, repeat=length):
@@ -161,5 +350,9 @@ if __name__ == "__main__":
     # single thread
     main_single(parse_args())
     
-    # multi process
-    main(parse_args())
\ No newline at end of file
+    # multi process, or GPU with --gpu
+    args = parse_args()
+    if args.gpu:
+        main_cuda(args)
+    else:
+        main(args)
\ No newline at end of file
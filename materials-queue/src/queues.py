@@ -2,7 +2,7 @@
 
 from collections import deque
 from dataclasses import dataclass
-from heapq import heapify, heappop, heappush
+from heapq import heappop, heappush
 from itertools import count
 from typing import Any
 
@@ -60,24 +60,66 @@ class Element:
 class MutableMinHeap(IterableMixin):
     # 使用任意类型的value作为key，可以通过__getitem__和__setitem__来访问priority
     # value作为dict的key，本身是immutable的
-    # 当priority发生变化时，先获取element，更新priority，然后重新进行heapify
+    # 额外记录每个value在heap中的位置，当priority发生变化时，只需从该位置开始上浮或下沉，O(log n)
     def __init__(self):
         super().__init__()
         self._elements_by_value = {}
+        self._index_by_value = {}
         self._elements = []
         self._counter = count()
 
     def __setitem__(self, unique_value, priority):
         if unique_value in self._elements_by_value:
             self._elements_by_value[unique_value].priority = priority
-            heapify(self._elements) # 重新进行heapify
+            # 已经出队的value只更新priority，不在heap中
+            if (index := self._index_by_value.get(unique_value)) is not None:
+                self._sift_up(index)
+                self._sift_down(self._index_by_value[unique_value])
         else:
             element = Element(priority, next(self._counter), unique_value)
             self._elements_by_value[unique_value] = element
-            heappush(self._elements, element)
+            self._elements.append(element)
+            self._index_by_value[unique_value] = len(self._elements) - 1
+            self._sift_up(len(self._elements) - 1)
 
     def __getitem__(self, unique_value):
         return self._elements_by_value[unique_value].priority
 
     def dequeue(self):
-        return heappop(self._elements).value
+        last = self._elements.pop()
+        if not self._elements:
+            del self._index_by_value[last.value]
+            return last.value
+        root, self._elements[0] = self._elements[0], last
+        self._index_by_value[last.value] = 0
+        del self._index_by_value[root.value]
+        self._sift_down(0)
+        return root.value
+
+    def _place(self, index, element):
+        self._elements[index] = element
+        self._index_by_value[element.value] = index
+
+    def _sift_up(self, index):
+        # 向根节点方向移动，直到父节点不大于该元素
+        element = self._elements[index]
+        while index > 0:
+            parent = (index - 1) // 2
+            if not element < self._elements[parent]:
+                break
+            self._place(index, self._elements[parent])
+            index = parent
+        self._place(index, element)
+
+    def _sift_down(self, index):
+        # 向叶子节点方向移动，直到较小的子节点不小于该元素
+        element = self._elements[index]
+        size = len(self._elements)
+        while (child := 2 * index + 1) < size:
+            if child + 1 < size and self._elements[child + 1] < self._elements[child]:
+                child += 1
+            if not self._elements[child] < element:
+                break
+            self._place(index, self._elements[child])
+            index = child
+        self._place(index, element)
@@ -1,12 +1,20 @@
 import networkx as nx
+import os
+import pickle
+import sys
+import tempfile
 from typing import NamedTuple
-from queues import Queue, Stack
+from hashlib import sha1
+from pathlib import Path
+from queues import Stack
 from collections import deque
 from queues import MutableMinHeap
 
 # define a class to store the City information
 # City is a node in the graph
 # 自定义节点类，用于存储城市信息，使用NamedTuple作为基类，可以保证实例化后的对象是不可变的
+# City是networkx邻接表和visited集合的key，NamedTuple的__hash__和__eq__由C实现
+# 虽然frozen dataclass(slots=True)的属性访问更快，但hash和比较在Python中执行，BFS整体反而更慢
 class City(NamedTuple):
     name: str
     country: str
@@ -39,7 +47,12 @@ get_graph_from_dot = lambda file_name: nx.nx_agraph.read_dot(file_name)
 
 # input: a graph, a node | return: a list of neighbors of the node
 # 输入一个graph和一个node，返回一个list，包含该node的所有neighbors
-get_neighbors_of_node = lambda network, node: network.neighbors(node)
+# load_graph创建的graph中预先计算了邻接表，直接O(1)获取；其他graph退回到network.neighbors
+# 返回tuple，调用方无法修改graph中共享的邻接表
+def get_neighbors_of_node(network, node):
+    if (adjacency := network.graph.get("adjacency")) is not None:
+        return adjacency[node]
+    return tuple(network.neighbors(node))
 
 # input: a graph node | return: a City object
 # 输入一个graph node，返回一个City对象
@@ -64,18 +77,76 @@ def create_cities_from_graph(graph, node_factory=create_city_from_graph_node) ->
 
 # 整合上述两个方法，输入一个dot文件
 # 返回一个dict，key为节点名称，value为对应的对象
-# 额外返回一个nx.Graph，包含节点和加权边
+# 额外返回一个nx.Graph，包含节点和加权边，以及预先计算的邻接表
+# 解析.dot文件很慢，解析结果以pickle的形式缓存在.dot文件旁的cache/目录中
 def load_graph(file_name, node_factory):
     """ The function takes a filename and a callable factory for the node objects, 
         such as your City.from_dict() class method.
 
+    The parsed result is cached in cache/{hash}.pkl next to the file, where the hash
+    covers the file content, the factory's code and the source of the module that
+    defines the factory, so editing any of them parses the file again. Factories that
+    can't be identified this way (closures, callable objects, functions without a
+    source file) are never cached. A cache entry that fails to load, e.g. a truncated
+    file, a pickle from another networkx version, or a node class from another module
+    that was renamed or changed its fields, is treated as a miss and parsed again.
+
     Args:
         file_name (str): a filename, format is .dot
         node_factory (callable factory): a callable factory for the node objects
 
     Returns:
-        dict, Graph: a mapping of nodes and a new graph comprising nodes and weighted edges
+        dict, Graph: a mapping of nodes and a new graph comprising nodes and weighted edges,
+            the graph keeps a tuple of neighbors per node in network.graph["adjacency"],
+            and a tuple of (distance, name) sorted by distance in network.graph["sorted_adjacency"].
+            These are computed once, so the graph must not be mutated afterwards
+            (add_edge, remove_node, ...), or the neighbor helpers return stale neighbors.
     """
+    if (fingerprint := get_factory_fingerprint(node_factory)) is None:
+        return parse_graph(file_name, node_factory)
+
+    key = sha1(Path(file_name).read_bytes())
+    key.update(fingerprint)
+    cache_file = Path(file_name).parent / "cache" / f"{key.hexdigest()}.pkl"
+    if cache_file.exists():
+        try:
+            with cache_file.open("rb") as file:
+                return pickle.load(file)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError):
+            pass # 缓存损坏或与当前代码不兼容时当作未命中，重新解析后覆盖
+
+    nodes, network = parse_graph(file_name, node_factory)
+    cache_file.parent.mkdir(exist_ok=True)
+    # 先写入临时文件再替换，避免中断时留下不完整的缓存
+    # 临时文件名由mkstemp生成，多个进程同时解析时不会写入同一个文件
+    fd, temp_file = tempfile.mkstemp(suffix=".tmp", dir=cache_file.parent)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump((nodes, network), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+    except BaseException:
+        os.unlink(temp_file)
+        raise
+    return nodes, network
+
+# input: a node factory | return: bytes identifying the factory, or None if it can't be identified
+# 不能只使用__qualname__：所有lambda的__qualname__都是<lambda>
+def get_factory_fingerprint(node_factory):
+    function = getattr(node_factory, "__func__", node_factory) # classmethod/method -> function
+    code = getattr(function, "__code__", None)
+    module = sys.modules.get(getattr(function, "__module__", None))
+    source_file = getattr(module, "__file__", None)
+    if code is None or function.__closure__ or source_file is None:
+        return None
+    owner = getattr(node_factory, "__self__", None)
+    return b"\0".join([
+        Path(source_file).read_bytes(),
+        f"{getattr(owner, '__qualname__', '')}.{function.__qualname__}:{code.co_firstlineno}".encode("utf-8"),
+        repr((code.co_names, code.co_consts)).encode("utf-8"),
+        code.co_code,
+    ])
+
+def parse_graph(file_name, node_factory):
     graph = nx.nx_agraph.read_dot(file_name)
     # <class 'dict'> 
     nodes = {
@@ -83,22 +154,33 @@ def load_graph(file_name, node_factory):
         for name, attributes in graph.nodes(data=True)
     }
     # <class 'networkx.classes.graph.Graph'>
-    return nodes, nx.Graph(
+    network = nx.Graph(
         (nodes[name1], nodes[name2], weights)
         for name1, name2, weights in graph.edges(data=True)
     )
+    # network.neighbors每次调用都会返回一个新的iterator，预先计算一次邻接表供遍历时重复使用
+    # 邻接表只在这里计算一次，之后修改network不会更新它们
+    network.graph["adjacency"] = {
+        node: tuple(network.neighbors(node)) for node in network.nodes
+    }
+    network.graph["sorted_adjacency"] = {
+        node: sort_neighbors_by_distance(network, node) for node in network.nodes
+    }
+    return nodes, network
 
 # input: a graph, a node | return: a list of neighbors of the node and the distance between them, sorted by distance
 # 输入一个graph和一个node，返回一个list，包含该node的所有neighbors和距离，且按照距离排序
+# load_graph创建的graph中预先排好了序，直接O(1)获取；其他graph每次调用时排序
 def get_neighbors_and_distance_of_node(network, node):
-    
-    def sort_by(items, strategy):
-        return sorted(items, key=lambda x: strategy(x[1]))
-
-    def by_distance(item):
-        return int(item["distance"])
+    if (sorted_adjacency := network.graph.get("sorted_adjacency")) is not None:
+        return sorted_adjacency[node]
+    return sort_neighbors_by_distance(network, node)
 
-    return [[weights["distance"], neighbor.name] for neighbor, weights in sort_by(network[node].items(), by_distance)]
+def sort_neighbors_by_distance(network, node):
+    return tuple(sorted(
+        ((int(weights["distance"]), neighbor.name) for neighbor, weights in network[node].items()),
+        key=lambda item: item[0],
+    ))
 
 # even with bfs, the search order can vary a lot depends on the order you traverse the neighbors
 # networkx provide a key arg "sort_neighbors", allowing you to define the order of the neighbors
@@ -108,18 +190,19 @@ def order(neighbors):
 
 # 输入一个graph和一个起始节点，返回一个生成器，以BFS顺序遍历所有节点
 def traverse_network_bfs(network, root):
-    q = Queue(root)
+    # 直接使用deque而不是Queue的包装
+    # visited使用set：不需要在第一次yield之前遍历所有节点，保持生成器的惰性
+    q = deque([root])
     visited = {root}
     while q:
-        yield (node := q.dequeue())
+        yield (node := q.popleft())
         # equivalent to:
-        # node = q.dequeue()
+        # node = q.popleft()
         # yield node
-        neighbors = get_neighbors_of_node(network, node)
-        for neighbor in neighbors:
+        for neighbor in get_neighbors_of_node(network, node):
             if neighbor not in visited:
                 visited.add(neighbor)
-                q.enqueue(neighbor)
+                q.append(neighbor)
 
 # 输入一个graph和一个起始节点，返回一个生成器，以DFS顺序遍历所有节点
 def traverse_network_dfs(network, root):
@@ -172,27 +255,50 @@ def retrace(previous, source, destination):
 def shortest_path(network, source, destination, order_by=None):
     """search the shortest path between two nodes in a graph, if there are multiple shortest paths, return the first one
 
+    使用双向BFS：分别从起点和终点出发，每次扩展较小的一侧的一整层，两侧相遇时拼接路径
+    与networkx的bidirectional_shortest_path的扩展顺序相同
+
     Args:
         network (networkx Graph): a graph
         start (_type_): start node
         end (_type_): end node
         order_by (_type_, optional): Defaults to None.
     """
-    queue = Queue(source)
-    visited = {source}
-    previous = {} # used for retrace
-    while queue:
-        node = queue.dequeue()
-        neighbors = get_neighbors_of_node(network, node)
-        if order_by:
-            neighbors.sort(key=order_by)
-        for neighbor in neighbors:
-            if neighbor not in visited:
-                visited.add(neighbor)
-                queue.enqueue(neighbor)
-                previous[neighbor] = node
-                if neighbor == destination:
-                    return retrace(previous, source, destination)
+    if source == destination:
+        return [source]
+
+    # 排序结果只在本次搜索中复用，每个节点最多排序一次，不会写入network
+    sorted_neighbors = {}
+
+    def neighbors_of(node):
+        if not order_by:
+            return get_neighbors_of_node(network, node)
+        if (neighbors := sorted_neighbors.get(node)) is None:
+            # 不能原地sort，邻接表是共享的
+            neighbors = sorted_neighbors[node] = sorted(
+                get_neighbors_of_node(network, node), key=order_by
+            )
+        return neighbors
+
+    previous = {source: None} # 从起点出发，用于retrace到起点
+    following = {destination: None} # 从终点出发，用于retrace到终点
+    forward, backward = [source], [destination]
+    while forward and backward:
+        if len(forward) <= len(backward):
+            this_level, forward = forward, []
+            visited, other_side, frontier = previous, following, forward
+        else:
+            this_level, backward = backward, []
+            visited, other_side, frontier = following, previous, backward
+        for node in this_level:
+            for neighbor in neighbors_of(node):
+                if neighbor not in visited:
+                    visited[neighbor] = node
+                    frontier.append(neighbor)
+                if neighbor in other_side:
+                    # 两侧相遇，起点 → neighbor，再接上neighbor → 终点
+                    path = retrace(previous, source, neighbor)
+                    return path + retrace(following, destination, neighbor)[::-1][1:]
     return None
 
 def connected(graph, source, destination):